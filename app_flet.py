@@ -3,13 +3,14 @@
 DashFin — App Flet com:
 - Gráfico interativo (Plotly) + previsão (Prophet)
 - Geração de relatórios (Excel/PDF)
+- Arquivo colunar (Parquet) de cotações e previsões
 - Automação periódica
 - Alertas inteligentes por E-MAIL (SMTP) e WhatsApp (Twilio)
 - Cooldown para evitar alertas repetidos
 - Uso de variáveis de ambiente via python-dotenv
 
 Dependências:
-pip install flet plotly pandas requests prophet fpdf xlsxwriter twilio python-dotenv
+pip install flet plotly pandas pyarrow requests prophet fpdf xlsxwriter twilio python-dotenv
 
 Variáveis de ambiente (preferível usar .env):
 # SMTP (ex: Gmail)
@@ -40,6 +41,7 @@ from twilio.rest import Client
 from dotenv import load_dotenv
 
 from data import pegar_dados
+from archive import arquivar_cotacoes, arquivar_previsao, carregar_cotacoes, exportar_excel
 
 # Carrega .env se existir
 load_dotenv()
@@ -152,10 +154,10 @@ def gerar_previsao(df: pd.DataFrame, dias_futuros: int = 7) -> pd.DataFrame:
     })
     return df_pred.tail(dias_futuros)
 
-def gerar_excel_arquivo(df: pd.DataFrame, moeda: str) -> str:
+def gerar_excel_arquivo(moeda: str, inicio: datetime) -> Optional[str]:
+    """Exporta do arquivo colunar as cotações a partir de inicio. Retorna None se não há dados."""
     file_path = os.path.join(REPORTS_FOLDER, f"{moeda}_cotacoes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
-    df.to_excel(file_path, index=False)
-    return file_path
+    return exportar_excel(moeda, file_path, inicio=inicio)
 
 def gerar_pdf_arquivo(df: pd.DataFrame, moeda: str) -> str:
     df_pred = gerar_previsao(df, dias_futuros=3)
@@ -304,13 +306,16 @@ def main(page: ft.Page):
     plot_chart = PlotlyChart()
     automator = Automator()
 
-    # Função que atualiza UI, plota gráfico, salva df no client_storage e verifica alertas
+    # Função que atualiza UI, plota gráfico, arquiva as cotações e verifica alertas
     def atualizar_ui(moeda: str, dias: int):
         try:
             lbl_status.value = "Atualizando dados..."
             page.update()
 
             df = pegar_dados(moeda, dias)
+            # dado velho servido do cache (API falhando): avisa e não dispara alertas
+            stale = df.attrs.get("stale", False)
+            idade_min = df.attrs.get("idade", 0) / 60
             # garantir tipos
             df['timestamp'] = pd.to_datetime(df['timestamp'])
             df['bid'] = df['bid'].astype(float)
@@ -318,6 +323,13 @@ def main(page: ft.Page):
             # previsão (5 dias)
             df_pred = gerar_previsao(df, dias_futuros=5)
 
+            # arquivo colunar (a previsão é guardada uma vez por dia)
+            try:
+                arquivar_cotacoes(df, moeda)
+                arquivar_previsao(df_pred, moeda, dias, modelo="prophet")
+            except Exception as e:
+                print("Erro ao arquivar dados:", e)
+
             # criar gráfico
             fig = px.line(df, x="timestamp", y="bid", title=f"{moeda}/BRL — Últimos {dias} dias", labels={"timestamp": "Data", "bid": "Valor (R$)"}, markers=True)
             fig.add_scatter(x=df_pred["timestamp"], y=df_pred["bid"], mode="lines+markers", name="Previsão")
@@ -329,8 +341,11 @@ def main(page: ft.Page):
             for i in range(len(df_pred)):
                 previsao_list.controls.append(ft.Text(f"{df_pred.iloc[i]['timestamp'].strftime('%Y-%m-%d')}: R$ {df_pred.iloc[i]['bid']:.4f}"))
 
+            if stale:
+                lbl_status.value = f"⚠️ API indisponível — dados em cache de {idade_min:.0f} min: {moeda} (último: R$ {df['bid'].iloc[-1]:.4f})"
+                page.update()
+                return
             lbl_status.value = f"✅ Atualizado: {moeda} (último: R$ {df['bid'].iloc[-1]:.4f})"
-            page.client_storage.set("last_df", df.to_json(date_format="iso", orient="split"))
 
             # verificar alertas configurados
             try:
@@ -351,25 +366,25 @@ def main(page: ft.Page):
             lbl_status.value = f"Erro na atualização: {e}"
             page.update()
 
-    # handlers de export / automação
+    # handlers de export / automação (leem do arquivo colunar só a janela selecionada)
+    def inicio_janela() -> datetime:
+        return datetime.now() - timedelta(days=int(dias_slider.value))
+
     def gerar_excel(e):
-        df_json = page.client_storage.get("last_df")
-        if not df_json:
+        path = gerar_excel_arquivo(moeda_dropdown.value, inicio_janela())
+        if not path:
             lbl_status.value = "⚠️ Primeiro atualize os dados."
             page.update()
             return
-        df = pd.read_json(df_json, orient="split")
-        path = gerar_excel_arquivo(df, moeda_dropdown.value)
         lbl_status.value = f"📊 Excel salvo: {path}"
         page.update()
 
     def gerar_pdf(e):
-        df_json = page.client_storage.get("last_df")
-        if not df_json:
+        df = carregar_cotacoes(moeda_dropdown.value, inicio=inicio_janela())
+        if df.empty:
             lbl_status.value = "⚠️ Primeiro atualize os dados."
             page.update()
             return
-        df = pd.read_json(df_json, orient="split")
         path = gerar_pdf_arquivo(df, moeda_dropdown.value)
         lbl_status.value = f"📄 PDF salvo: {path}"
         page.update()
@@ -0,0 +1,256 @@
+import os
+import glob
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Pasta do arquivo colunar (Parquet particionado por moeda/mês)
+ARCHIVE_FOLDER = "archive"
+COTACOES_FOLDER = os.path.join(ARCHIVE_FOLDER, "cotacoes")
+PREVISOES_FOLDER = os.path.join(ARCHIVE_FOLDER, "previsoes")
+
+# Idade (s) a partir da qual uma trava de compactação é considerada abandonada
+TRAVA_EXPIRA = 600
+
+# Partições no estilo hive: archive/cotacoes/moeda=USD/mes=2025-10/part-....parquet
+CAMPOS_PARTICAO = ("moeda", "mes")
+PARTICOES = ds.partitioning(pa.schema([("moeda", pa.string()), ("mes", pa.string())]), flavor="hive")
+
+SCHEMA_COTACOES = pa.schema([
+    ("timestamp", pa.timestamp("ns")),
+    ("bid", pa.float64()),
+    ("moeda", pa.string()),
+    ("mes", pa.string()),
+])
+
+SCHEMA_PREVISOES = pa.schema([
+    ("timestamp", pa.timestamp("ns")),
+    ("bid", pa.float64()),
+    ("min", pa.float64()),
+    ("max", pa.float64()),
+    ("gerado_em", pa.timestamp("ns")),
+    ("dias_historico", pa.int64()),
+    ("modelo", pa.string()),
+    ("moeda", pa.string()),
+    ("mes", pa.string()),
+])
+
+def _sem_particao(schema: pa.Schema) -> pa.Schema:
+    """Schema gravado dentro de cada arquivo (moeda/mes vêm do caminho)."""
+    return pa.schema([campo for campo in schema if campo.name not in CAMPOS_PARTICAO])
+
+def _timestamp(valor) -> pa.Scalar:
+    # pandas 2+ mantém a unidade de str/datetime/date (s, us): normaliza para ns antes do pyarrow
+    return pa.scalar(pd.Timestamp(valor).as_unit("ns").to_datetime64(), pa.timestamp("ns"))
+
+def _pasta_particao(pasta: str, moeda: str, mes: str) -> str:
+    return os.path.join(pasta, f"moeda={moeda}", f"mes={mes}")
+
+def _acrescentar(df: pd.DataFrame, pasta: str, moeda: str, schema: pa.Schema):
+    """
+    Grava df (já com a coluna mes) como novos arquivos, um por partição. Nunca lê
+    nem apaga arquivos existentes: escritores concorrentes não se atrapalham.
+    """
+    schema_arquivo = _sem_particao(schema)
+    for mes, df_mes in df.groupby('mes'):
+        pasta_particao = _pasta_particao(pasta, moeda, mes)
+        os.makedirs(pasta_particao, exist_ok=True)
+        _gravar_arquivo(df_mes, pasta_particao, schema_arquivo)
+
+def _gravar_arquivo(df: pd.DataFrame, pasta_particao: str, schema_arquivo: pa.Schema) -> str:
+    # Grava com prefixo "." (ignorado pelos leitores) e só então publica com os.replace
+    nome = f"part-{uuid.uuid4().hex}.parquet"
+    tmp_path = os.path.join(pasta_particao, f".{nome}.tmp")
+    tabela = pa.Table.from_pandas(df[schema_arquivo.names], schema=schema_arquivo, preserve_index=False)
+    try:
+        pq.write_table(tabela, tmp_path)
+        os.replace(tmp_path, os.path.join(pasta_particao, nome))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return nome
+
+def _filtro(moeda=None, inicio=None, fim=None, coluna="timestamp"):
+    """Monta a expressão usada para poda de partições e pushdown no Parquet."""
+    exprs = []
+    if moeda:
+        exprs.append(ds.field("moeda") == moeda.upper())
+    if inicio is not None:
+        exprs.append(ds.field("mes") >= pd.Timestamp(inicio).strftime("%Y-%m"))
+        exprs.append(ds.field(coluna) >= _timestamp(inicio))
+    if fim is not None:
+        exprs.append(ds.field("mes") <= pd.Timestamp(fim).strftime("%Y-%m"))
+        exprs.append(ds.field(coluna) <= _timestamp(fim))
+    filtro = None
+    for expr in exprs:
+        filtro = expr if filtro is None else filtro & expr
+    return filtro
+
+def _ler(pasta: str, schema: pa.Schema, filtro, colunas=None) -> pd.DataFrame:
+    for tentativa in range(3):
+        if not os.path.isdir(pasta):
+            return schema.empty_table().select(colunas or schema.names).to_pandas()
+        try:
+            dataset = ds.dataset(pasta, format="parquet", schema=schema, partitioning=PARTICOES)
+            return dataset.to_table(columns=colunas, filter=filtro).to_pandas()
+        except OSError:
+            # uma compactação pode ter trocado os arquivos entre a listagem e a leitura
+            if tentativa == 2:
+                raise
+
+def _ultima_por_dia(df: pd.DataFrame) -> pd.DataFrame:
+    """Mantém uma cotação por dia: a de timestamp mais recente."""
+    dia = df['timestamp'].dt.normalize()
+    return df.assign(_dia=dia).sort_values('timestamp').drop_duplicates('_dia', keep='last').drop(columns='_dia')
+
+def _uma_previsao_por_dia(df: pd.DataFrame) -> pd.DataFrame:
+    """Mantém uma previsão por (modelo, dias_historico, dia em que foi gerada, data prevista)."""
+    dia_gerado = df['gerado_em'].dt.normalize()
+    dia_previsto = df['timestamp'].dt.normalize()
+    return (df.assign(_gerado=dia_gerado, _previsto=dia_previsto)
+              .sort_values('gerado_em')
+              .drop_duplicates(['modelo', 'dias_historico', '_gerado', '_previsto'], keep='last')
+              .drop(columns=['_gerado', '_previsto']))
+
+# ----- Cotações -----
+def arquivar_cotacoes(df: pd.DataFrame, moeda: str) -> int:
+    """
+    Acrescenta ao arquivo as cotações de df (cols timestamp, bid) de dias ainda não
+    arquivados ou mais recentes que a cotação arquivada do dia. Retorna a
+    quantidade de cotações gravadas.
+    """
+    if df.empty:
+        return 0
+    moeda = moeda.upper()
+    df = df[['timestamp', 'bid']].copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp']).astype("datetime64[ns]")
+    df['bid'] = df['bid'].astype(float)
+    df = _ultima_por_dia(df)
+
+    # Só lê a faixa de dias coberta por df para comparar com o que já existe
+    existentes = carregar_cotacoes(moeda, df['timestamp'].min().normalize(),
+                                   df['timestamp'].max().normalize() + pd.Timedelta(days=1))
+    ultima = existentes.set_index(existentes['timestamp'].dt.normalize())['timestamp']
+    arquivada = pd.Series(ultima.reindex(df['timestamp'].dt.normalize()).values, index=df.index)
+    df = df[arquivada.isna() | (df['timestamp'] > arquivada)]
+    if df.empty:
+        return 0
+
+    df['mes'] = df['timestamp'].dt.strftime("%Y-%m")
+    _acrescentar(df, COTACOES_FOLDER, moeda, SCHEMA_COTACOES)
+    return len(df)
+
+def carregar_cotacoes(moeda: str, inicio=None, fim=None) -> pd.DataFrame:
+    """Carrega do arquivo só o recorte pedido, no mesmo formato de pegar_dados (timestamp, bid)."""
+    df = _ler(COTACOES_FOLDER, SCHEMA_COTACOES, _filtro(moeda, inicio, fim), colunas=['timestamp', 'bid'])
+    # o arquivo é só de acréscimo: o mesmo dia pode aparecer várias vezes até a compactação
+    return _ultima_por_dia(df).reset_index(drop=True)
+
+# ----- Previsões -----
+def arquivar_previsao(df_pred: pd.DataFrame, moeda: str, dias_historico: int, modelo: str,
+                      gerado_em: datetime = None) -> int:
+    """
+    Acrescenta uma previsão gerada (cols timestamp, bid e opcionalmente min/max).
+    Guarda uma previsão por (moeda, dia de geração, modelo, dias_historico): se já
+    existe uma do mesmo dia, não grava nada. Retorna a quantidade de linhas gravadas.
+    """
+    if df_pred.empty:
+        return 0
+    moeda = moeda.upper()
+    gerado_em = pd.Timestamp(gerado_em or datetime.now()).as_unit("ns")
+    dia = gerado_em.normalize()
+    # não usa _filtro: a poda por mês vale para timestamp (data prevista), não para gerado_em
+    filtro = ((ds.field("moeda") == moeda) & (ds.field("modelo") == modelo)
+              & (ds.field("dias_historico") == int(dias_historico))
+              & (ds.field("gerado_em") >= _timestamp(dia))
+              & (ds.field("gerado_em") < _timestamp(dia + pd.Timedelta(days=1))))
+    if not _ler(PREVISOES_FOLDER, SCHEMA_PREVISOES, filtro, colunas=['gerado_em']).empty:
+        return 0
+
+    df = df_pred.copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp']).astype("datetime64[ns]")
+    for col in ('min', 'max'):
+        if col not in df:
+            df[col] = float('nan')
+    df['gerado_em'] = gerado_em
+    df['dias_historico'] = int(dias_historico)
+    df['modelo'] = modelo
+    df['mes'] = df['timestamp'].dt.strftime("%Y-%m")
+    _acrescentar(df, PREVISOES_FOLDER, moeda, SCHEMA_PREVISOES)
+    return len(df)
+
+def carregar_previsoes(moeda: str, inicio=None, fim=None, modelo: str = None) -> pd.DataFrame:
+    """Carrega previsões arquivadas cujo timestamp (data prevista) está no intervalo."""
+    filtro = _filtro(moeda, inicio, fim)
+    if modelo:
+        filtro = filtro & (ds.field("modelo") == modelo) if filtro is not None else ds.field("modelo") == modelo
+    df = _ler(PREVISOES_FOLDER, SCHEMA_PREVISOES, filtro,
+              colunas=['timestamp', 'bid', 'min', 'max', 'gerado_em', 'dias_historico', 'modelo'])
+    # escritores concorrentes podem ter gravado a mesma previsão do dia duas vezes
+    df = _uma_previsao_por_dia(df)
+    return df.sort_values(['gerado_em', 'timestamp']).reset_index(drop=True)
+
+# ----- Compactação -----
+def _travar(pasta_particao: str):
+    """Trava de compactação da partição (arquivo criado com O_EXCL). Retorna o caminho ou None."""
+    trava = os.path.join(pasta_particao, ".compactando.lock")
+    for _ in range(2):
+        try:
+            os.close(os.open(trava, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return trava
+        except FileExistsError:
+            try:
+                # trava esquecida por um processo que morreu no meio da compactação
+                if time.time() - os.path.getmtime(trava) < TRAVA_EXPIRA:
+                    return None
+                os.remove(trava)
+            except FileNotFoundError:
+                pass
+    return None
+
+def compactar() -> int:
+    """
+    Junta os arquivos de cada partição num só, já sem duplicatas. Roda separada das
+    gravações (que só acrescentam arquivos novos) e só apaga os arquivos que leu,
+    então acréscimos concorrentes não se perdem. Partições travadas por outra
+    compactação são puladas. Retorna quantas partições foram compactadas.
+    """
+    compactadas = 0
+    for pasta, schema, deduplicar in ((COTACOES_FOLDER, SCHEMA_COTACOES, _ultima_por_dia),
+                                      (PREVISOES_FOLDER, SCHEMA_PREVISOES, _uma_previsao_por_dia)):
+        schema_arquivo = _sem_particao(schema)
+        for pasta_particao in sorted(glob.glob(os.path.join(pasta, "moeda=*", "mes=*"))):
+            arquivos = sorted(glob.glob(os.path.join(pasta_particao, "*.parquet")))
+            if len(arquivos) < 2:
+                continue
+            trava = _travar(pasta_particao)
+            if trava is None:
+                continue
+            try:
+                arquivos = sorted(glob.glob(os.path.join(pasta_particao, "*.parquet")))
+                df = ds.dataset(arquivos, format="parquet", schema=schema_arquivo).to_table().to_pandas()
+                _gravar_arquivo(deduplicar(df), pasta_particao, schema_arquivo)
+                for arquivo in arquivos:
+                    os.remove(arquivo)
+                compactadas += 1
+            finally:
+                os.remove(trava)
+    return compactadas
+
+# ----- Exportação -----
+def exportar_excel(moeda: str, destino, inicio=None, fim=None):
+    """
+    Gera um xlsx a partir do arquivo (o xlsx é só uma visão de exportação).
+    destino pode ser um caminho ou um buffer (io.BytesIO). Retorna None se o recorte está vazio.
+    """
+    df = carregar_cotacoes(moeda, inicio, fim)
+    if df.empty:
+        return None
+    with pd.ExcelWriter(destino, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=False, sheet_name='Cotações')
+    return destino
@@ -1,6 +1,11 @@
 import os
+import json
 import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from data import pegar_dados
+from archive import arquivar_cotacoes, arquivar_previsao, compactar
 from fpdf import FPDF
 import pandas as pd
 import io
@@ -12,7 +17,7 @@ def gerar_previsao(df, dias_futuros=3):
     df = df.reset_index(drop=True)
     x = np.arange(len(df)).reshape(-1,1)
     y = df['bid'].values
-    modelo = LinearRegression
+    modelo = LinearRegression()
     modelo.fit(x,y)
     x_futuro = np.arange(len(df), len(df) + dias_futuros).reshape(-1,1)
     y_pred = modelo.predict(x_futuro)
@@ -25,53 +30,189 @@ def gerar_previsao(df, dias_futuros=3):
 REPORTS_FOLDER = "reports"
 os.makedirs(REPORTS_FOLDER, exist_ok=True)
 
+# Formatos de relatório suportados
+FORMATOS = ("xlsx", "pdf")
+
+# Caminho do relatório (com janela de dias e carimbo de data quando informados)
+def caminho_relatorio(moeda, extensao, dias=None, carimbo=None):
+    nome = moeda
+    if dias is not None:
+        nome += f"_{dias}d"
+    nome += "_cotacoes"
+    if carimbo:
+        nome += f"_{carimbo}"
+    return os.path.join(REPORTS_FOLDER, f"{nome}.{extensao}")
+
+# Escreve em arquivo temporário e só então renomeia, para nunca deixar relatório pela metade
+def salvar_atomico(file_path, escrever):
+    # mantém a extensão real no temporário (o ExcelWriter escolhe/valida o formato por ela)
+    raiz, ext = os.path.splitext(file_path)
+    tmp_path = f"{raiz}.{os.getpid()}.tmp{ext}"
+    try:
+        escrever(tmp_path)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return file_path
+
 # Função de geração de relatório (igual ao main.py)
-def gerar_excel(df, moeda):
+def gerar_excel(df, moeda, file_path=None):
     df_pred = gerar_previsao(df)
     df_completo = pd.concat([df, df_pred], ignore_index=True)
-    file_path = os.path.join(REPORTS_FOLDER, f"{moeda}_cotacoes.xlsx")
-    with pd.ExcelWriter(file_path, engine='xlsxwriter') as writer:
-        df_completo.to_excel(writer, index=False, sheet_name='Cotações')
-        writer.save()
+    file_path = file_path or caminho_relatorio(moeda, "xlsx")
+
+    def _escrever(path):
+        with pd.ExcelWriter(path, engine='xlsxwriter') as writer:
+            df_completo.to_excel(writer, index=False, sheet_name='Cotações')
+
+    salvar_atomico(file_path, _escrever)
     print(f"Excel salvo: {file_path}")
-def gerar_pdf(df, moeda):
+    return file_path
+
+def gerar_pdf(df, moeda, file_path=None):
     pdf = FPDF()
     pdf.add_page()
     pdf.set_font("Arial", 'B', 16)
-    pdf.cell(0, 10, f"Cotações {moeda}/BRL", In=True, align='C')
-    pdf.In(10)
+    pdf.cell(0, 10, f"Cotações {moeda}/BRL", ln=True, align='C')
+    pdf.ln(10)
     pdf.set_font("Arial", '', 12)
 
     # Gerar previsões
     df_pred = gerar_previsao(df)
-    
+
     # Dados históricos
-    pdf.cell(0, 10, "Histórico:", In=True)
+    pdf.cell(0, 10, "Histórico:", ln=True)
     for i in range(len(df)):
         data = df.iloc[i]['timestamp'].strftime('%Y-%m-%d')
         valor = df.iloc[i]['bid']
-        pdf.cell(0, 10, f"{data}: R$ {valor:.2f}", In=True)
-        
-    pdf.In(5)
+        pdf.cell(0, 10, f"{data}: R$ {valor:.2f}", ln=True)
+
+    pdf.ln(5)
     # Previsão
-    pdf.cell(0, 10, "Previsão:", In=True)
+    pdf.cell(0, 10, "Previsão:", ln=True)
     for i in range(len(df_pred)):
         data = df_pred.iloc[i]['timestamp'].strftime('%Y-%m-%d')
         valor = df_pred.iloc[i]['bid']
-        pdf.cell(0, 10, f"{data}: R$ {valor:.2f}", In=True)
-            
-    file_path = os.path.join(REPORTS_FOLDER, f"{moeda}_cotacoes.pdf")
-    pdf.output(file_path)
-    print(f"PDF salvo: {file_path}")    
-    
-    for i in range(len(df)):
-        data = df.iloc[i]['timestamp'].strftime('%Y-%m-%d')
-        valor = df.iloc[i]['bid']
-        pdf.cell(0, 10, f"{data}: R$ {valor:2f}", In=True)
-    file_path = os.path.join(REPORTS_FOLDER, f"{moeda}_cotacoes.pdf")
-    pdf.output(file_path)
+        pdf.cell(0, 10, f"{data}: R$ {valor:.2f}", ln=True)
+
+    file_path = file_path or caminho_relatorio(moeda, "pdf")
+    salvar_atomico(file_path, pdf.output)
     print(f"PDF salvo: {file_path}")
-    
+    return file_path
+
+# Grava cotações e previsões no arquivo colunar (os relatórios são só exportação)
+def arquivar(df, moeda, dias):
+    try:
+        arquivar_cotacoes(df, moeda)
+        # arquivar_previsao guarda só uma previsão por dia (as demais chamadas do dia são ignoradas)
+        for d in ([dias] if isinstance(dias, int) else dias):
+            arquivar_previsao(gerar_previsao(df.tail(d)), moeda, d, modelo="linear")
+    except Exception as e:
+        print(f"Erro ao arquivar {moeda}:", e)
+
+# Executado dentro do pool de processos: renderiza um relatório e mede o tempo
+# (o caminho vem pronto do processo pai, que é quem conhece REPORTS_FOLDER)
+def _renderizar_relatorio(df, moeda, formato, file_path):
+    inicio = time.perf_counter()
+    if formato == "xlsx":
+        gerar_excel(df, moeda, file_path)
+    else:
+        gerar_pdf(df, moeda, file_path)
+    return file_path, time.perf_counter() - inicio
+
+# Função de geração em lote
+def gerar_relatorios_lote(moedas=("USD",), dias=(7,), formatos=FORMATOS, max_workers=None):
+    """
+    Gera relatórios para toda a matriz (moeda, dias, formato) de uma vez.
+    Cada moeda é buscada uma única vez (com a maior janela de dias) e as
+    janelas menores são recortadas dela; a renderização roda em paralelo
+    num pool de processos. Ao final grava um manifesto JSON com os tempos.
+    Retorna o caminho do manifesto.
+    """
+    if not moedas:
+        raise ValueError("Informe ao menos uma moeda")
+    if not dias:
+        raise ValueError("Informe ao menos uma janela de dias")
+    invalidos = [f for f in formatos if f not in FORMATOS]
+    if not formatos or invalidos:
+        raise ValueError(f"Formatos inválidos: {invalidos or 'nenhum informado'} (use {', '.join(FORMATOS)})")
+    formatos = list(dict.fromkeys(formatos))
+    dias = sorted(set(int(d) for d in dias))
+    carimbo = datetime.now().strftime('%Y%m%d_%H%M%S')
+    inicio_lote = time.perf_counter()
+    manifesto = {
+        "carimbo": carimbo,
+        "moedas": list(moedas),
+        "dias": dias,
+        "formatos": formatos,
+        "buscas": [],
+        "relatorios": [],
+    }
+
+    # Busca compartilhada: uma requisição por moeda, em paralelo (I/O)
+    dados = {}
+    def _buscar(moeda):
+        inicio = time.perf_counter()
+        df = pegar_dados(moeda, max(dias))
+        return df, time.perf_counter() - inicio
+
+    print("Buscando dados...")
+    with ThreadPoolExecutor(max_workers=len(moedas) or 1) as pool:
+        futuros = {pool.submit(_buscar, moeda): moeda for moeda in moedas}
+        for futuro in as_completed(futuros):
+            moeda = futuros[futuro]
+            registro = {"moeda": moeda, "dias": max(dias)}
+            try:
+                dados[moeda], registro["segundos"] = futuro.result()
+                # dado servido do cache porque a API falhou
+                registro["stale"] = bool(dados[moeda].attrs.get("stale", False))
+            except Exception as e:
+                registro["erro"] = str(e)
+                print(f"Erro ao buscar {moeda}:", e)
+            manifesto["buscas"].append(registro)
+
+    # Arquivamento (serial, antes da renderização)
+    inicio_arquivo = time.perf_counter()
+    for moeda, df in dados.items():
+        arquivar(df, moeda, dias)
+    try:
+        compactar()
+    except Exception as e:
+        print("Erro ao compactar arquivo:", e)
+    manifesto["segundos_arquivamento"] = time.perf_counter() - inicio_arquivo
+
+    # Renderização (CPU): um processo por relatório
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futuros = {}
+        for moeda, df in dados.items():
+            for d in dias:
+                df_janela = df.tail(d).reset_index(drop=True)
+                for formato in formatos:
+                    file_path = caminho_relatorio(moeda, formato, d, carimbo)
+                    futuro = pool.submit(_renderizar_relatorio, df_janela, moeda, formato, file_path)
+                    futuros[futuro] = (moeda, d, formato)
+        for futuro in as_completed(futuros):
+            moeda, d, formato = futuros[futuro]
+            registro = {"moeda": moeda, "dias": d, "formato": formato}
+            try:
+                registro["arquivo"], registro["segundos"] = futuro.result()
+            except Exception as e:
+                registro["erro"] = str(e)
+                print(f"Erro ao gerar {formato} de {moeda} ({d} dias):", e)
+            manifesto["relatorios"].append(registro)
+
+    manifesto["segundos_total"] = time.perf_counter() - inicio_lote
+    manifesto_path = os.path.join(REPORTS_FOLDER, f"lote_{carimbo}.json")
+
+    def _escrever(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifesto, f, ensure_ascii=False, indent=2)
+
+    salvar_atomico(manifesto_path, _escrever)
+    print(f"Lote concluído em {manifesto['segundos_total']:.1f}s. Manifesto: {manifesto_path}")
+    return manifesto_path
+
     # Função principal da automação
 def automatizar(moeda="USD", dias=7, intervalo=3600):
     """"
@@ -81,12 +222,34 @@ def automatizar(moeda="USD", dias=7, intervalo=3600):
     while True:
         print("Buscando dados...")
         df = pegar_dados(moeda, dias)
+        if df.attrs.get("stale"):
+            print(f"API indisponível: usando dados em cache de {df.attrs['idade'] / 60:.0f} min atrás")
+        arquivar(df, moeda, dias)
         gerar_excel(df, moeda)
         gerar_pdf(df, moeda)
         print(f"Relatórios atualizados para {moeda}/BRL. Próxima atualização em {intervalo} segundos")
         time.sleep(intervalo)
-        
+
 # Exemplo: rodar a automação para USD, 7 dias de histórico, atualização a cada 1 hora
+#   python automation.py
+# Lote de fim de dia (todas as moedas, várias janelas):
+#   python automation.py lote --moedas USD EUR BTC --dias 7 15 30 --formatos xlsx pdf
+# Compactação do arquivo colunar (também roda ao fim de cada lote):
+#   python automation.py compactar
 if __name__ =="__main__":
-    automatizar(moeda="USD", dias=7, intervalo=3600)      
-    
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Automação de relatórios de cotações")
+    sub = parser.add_subparsers(dest="comando")
+    lote = sub.add_parser("lote", help="gera relatórios em lote para várias moedas e janelas")
+    lote.add_argument("--moedas", nargs="+", default=["USD", "EUR", "BTC"])
+    lote.add_argument("--dias", nargs="+", type=int, default=[7])
+    lote.add_argument("--formatos", nargs="+", choices=FORMATOS, default=list(FORMATOS))
+    lote.add_argument("--workers", type=int, default=None)
+    sub.add_parser("compactar", help="junta os arquivos de cada partição do arquivo colunar")
+    args = parser.parse_args()
+
+    if args.comando == "lote":
+        gerar_relatorios_lote(args.moedas, args.dias, args.formatos, args.workers)
+    elif args.comando == "compactar":
+        print(f"Partições compactadas: {compactar()}")
+    else:
+        automatizar(moeda="USD", dias=7, intervalo=3600)
@@ -1,17 +1,221 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
 import requests
-import pandas as pd 
+import pandas as pd
+
+# ----- Configurações da camada de busca -----
+TIMEOUT = (3.05, 10)          # (conexão, leitura) em segundos
+TENTATIVAS = 3                # tentativas por busca antes de desistir
+BACKOFF_BASE = 0.5            # espera base (s) do backoff exponencial
+BACKOFF_MAX = 8               # espera máxima (s) entre tentativas
+ORCAMENTO_ESPERA = 15         # espera total (s) entre tentativas de uma busca; Retry-After maior desiste
+CACHE_TTL = 300               # idade (s) a partir da qual o cache é considerado velho
+IDADE_MAXIMA = 6 * 3600       # idade (s) além da qual o cache velho não é mais servido
+TAXA_REQUISICOES = 1.0        # requisições por segundo (compartilhado entre todos os chamadores)
+RAJADA_REQUISICOES = 5        # rajada máxima permitida pelo limitador
+FALHAS_CIRCUITO = 5           # falhas seguidas que abrem o circuito
+ESPERA_CIRCUITO = 60          # tempo (s) com o circuito aberto antes de testar de novo
+
+class ErroAPI(Exception):
+    """Falha ao obter cotações da AwesomeAPI."""
+
+class ErroPedido(ErroAPI):
+    """A API respondeu, mas recusou o pedido (ex.: moeda inexistente): não adianta repetir."""
+
+class TokenBucket:
+    """Limitador de taxa (token bucket) seguro para uso entre threads."""
+    def __init__(self, taxa: float, capacidade: int):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._tokens = float(capacidade)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self, timeout: float = None) -> bool:
+        """Bloqueia até haver um token (ou até timeout). Retorna True se conseguiu."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                espera = (1 - self._tokens) / self.taxa
+            if limite is not None and agora + espera > limite:
+                return False
+            time.sleep(espera)
+
+class CircuitBreaker:
+    """Abre após falhas seguidas e só deixa uma tentativa passar depois do tempo de espera."""
+    def __init__(self, max_falhas: int, espera: float):
+        self.max_falhas = max_falhas
+        self.espera = espera
+        self._falhas = 0
+        self._aberto_em = None
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        with self._lock:
+            if self._aberto_em is None:
+                return True
+            if time.monotonic() - self._aberto_em >= self.espera:
+                # meio-aberto: libera uma tentativa e reinicia a contagem da espera
+                self._aberto_em = time.monotonic()
+                return True
+            return False
+
+    def sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._aberto_em = None
+
+    def falha(self):
+        with self._lock:
+            self._falhas += 1
+            if self._falhas >= self.max_falhas:
+                self._aberto_em = time.monotonic()
+
+# Estado compartilhado por todos os chamadores (app Flet, Automator, automação, dashboard)
+_sessao = requests.Session()
+_limitador = TokenBucket(TAXA_REQUISICOES, RAJADA_REQUISICOES)
+_circuito = CircuitBreaker(FALHAS_CIRCUITO, ESPERA_CIRCUITO)
+_cache = {}              # (moeda, dias) -> (df, instante da busca)
+_atualizando = set()     # chaves com atualização em andamento
+_cache_lock = threading.Lock()
+
+def _backoff(tentativa: int) -> float:
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** tentativa))
+
+def _segundos_retry_after(valor: str):
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos; None se inválido."""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(valor) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def _converter(dados) -> pd.DataFrame:
+    """Valida a resposta da API antes de montar o DataFrame."""
+    if isinstance(dados, dict) and 'code' in dados:
+        # ex.: {'status': 404, 'code': 'CoinNotExists', 'message': ...}
+        raise ErroPedido(f"{dados.get('code')}: {dados.get('message', '')}")
+    if not isinstance(dados, list) or not dados or not all(isinstance(d, dict) and 'timestamp' in d and 'bid' in d for d in dados):
+        raise ErroAPI(f"Resposta inesperada da API: {str(dados)[:200]}")
+    df =pd.DataFrame(dados)
+    df['timestamp'] = pd.to_datetime(df['timestamp'].astype(int), unit='s')
+    df['bid'] = df['bid'].astype(float)
+    df = df[['timestamp', 'bid']].sort_values('timestamp')
+    return df
+
+def _buscar(moeda: str, dias: int) -> pd.DataFrame:
+    """Busca na API com timeout, limite de taxa, backoff exponencial e circuit breaker."""
+    url =f'https://economia.awesomeapi.com.br/json/daily/{moeda}-BRL/{dias}'
+    ultimo_erro = None
+    esperado = 0.0
+    for tentativa in range(TENTATIVAS):
+        if not _circuito.permitir():
+            raise ErroAPI("Circuito aberto: API indisponível, tente novamente mais tarde")
+        if not _limitador.adquirir(timeout=TIMEOUT[1]):
+            raise ErroAPI("Limite de requisições atingido")
+        retry_after = None
+        try:
+            r = _sessao.get(url, timeout=TIMEOUT)
+        except requests.RequestException as e:
+            _circuito.falha()
+            ultimo_erro = e
+        else:
+            if r.status_code >= 500:
+                _circuito.falha()
+                ultimo_erro = ErroAPI(f"HTTP {r.status_code}")
+            elif r.status_code == 429:
+                # a API está de pé, só pediu para esperar: não conta como falha do circuito
+                _circuito.sucesso()
+                ultimo_erro = ErroAPI("HTTP 429")
+                retry_after = _segundos_retry_after(r.headers.get('Retry-After'))
+            elif r.status_code >= 400:
+                # 4xx é erro do pedido: não adianta repetir, e a API respondeu normalmente
+                _circuito.sucesso()
+                raise ErroPedido(f"Falha ao buscar {moeda}-BRL: HTTP {r.status_code}: {r.text[:200]}")
+            else:
+                try:
+                    df = _converter(r.json())
+                except ErroPedido as e:
+                    # corpo de erro bem formado (ex.: moeda inexistente)
+                    _circuito.sucesso()
+                    raise ErroPedido(f"Falha ao buscar {moeda}-BRL: {e}") from e
+                except (ValueError, TypeError, ErroAPI) as e:
+                    _circuito.falha()
+                    ultimo_erro = e
+                else:
+                    _circuito.sucesso()
+                    return df
+        if tentativa == TENTATIVAS - 1:
+            break
+        espera = retry_after if retry_after is not None else _backoff(tentativa)
+        if esperado + espera > ORCAMENTO_ESPERA:
+            raise ErroAPI(f"Falha ao buscar {moeda}-BRL: {ultimo_erro} "
+                          f"(espera de {espera:.0f}s excede o orçamento de {ORCAMENTO_ESPERA}s)")
+        time.sleep(espera)
+        esperado += espera
+    raise ErroAPI(f"Falha ao buscar {moeda}-BRL: {ultimo_erro}")
+
+def _servir(df: pd.DataFrame, buscado_em: float, erro: Exception = None) -> pd.DataFrame:
+    """
+    Devolve uma cópia de df com a idade dos dados em df.attrs['idade'] (segundos) e
+    df.attrs['stale']. Cache mais velho que IDADE_MAXIMA não é servido: levanta ErroAPI.
+    """
+    idade = time.monotonic() - buscado_em
+    if idade > IDADE_MAXIMA:
+        raise ErroAPI(f"Dados em cache com {idade / 3600:.1f}h, acima do limite de "
+                      f"{IDADE_MAXIMA / 3600:.0f}h" + (f": {erro}" if erro else "")) from erro
+    df = df.copy()
+    df.attrs['idade'] = idade
+    df.attrs['stale'] = idade >= CACHE_TTL
+    return df
 
 def pegar_dados(moeda='USD', dias=7):
     """"
     Busca as cotações dos últimos dias usando a API a AwesomeAPI
     Moeda: código da moeda (USD, EUR, BTC)
     dias: quantidade de dias de histórico
+    Dados com menos de CACHE_TTL segundos vêm do cache; depois disso a busca é
+    refeita (com os timeouts de _buscar). O dado velho só é devolvido se outra
+    chamada já está atualizando a mesma chave, se a busca falhar ou se o
+    circuito estiver aberto, e nunca além de IDADE_MAXIMA. A idade do dado fica
+    em df.attrs['idade'] e df.attrs['stale'].
     """
-    url =f'https://economia.awesomeapi.com.br/json/daily/{moeda}-BRL/{dias}'
-    r = requests.get(url)
-    dados = r.json()
-    df =pd.DataFrame(dados)
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-    df['bid'] = df['bid'].astype(float)
-    df = df[['timestamp', 'bid']].sort_values('timestamp')
-    return df
\ No newline at end of file
+    chave = (moeda.upper(), int(dias))
+    with _cache_lock:
+        em_cache = _cache.get(chave)
+        if em_cache is not None:
+            df, buscado_em = em_cache
+            if time.monotonic() - buscado_em < CACHE_TTL or chave in _atualizando:
+                return _servir(df, buscado_em)
+        _atualizando.add(chave)
+
+    try:
+        df = _buscar(*chave)
+    except ErroAPI as e:
+        if em_cache is None:
+            raise
+        print("Erro ao atualizar cotações (usando cache):", e)
+        return _servir(*em_cache, erro=e)
+    finally:
+        with _cache_lock:
+            _atualizando.discard(chave)
+
+    agora = time.monotonic()
+    with _cache_lock:
+        _cache[chave] = (df, agora)
+    return _servir(df, agora)
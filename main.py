@@ -5,7 +5,8 @@ import pandas as pd
 import numpy as np
 import time
 from sklearn.linear_model import LinearRegression
-from data import pegar_dados
+from data import pegar_dados, ErroAPI
+from archive import arquivar_cotacoes, arquivar_previsao, carregar_cotacoes
 from fpdf import FPDF
 import matplotlib.pyplot as plt
 
@@ -20,8 +21,25 @@ dias = st.slider("Selecione quantos dias de histórico deseja ver:", min_value=5
 
 # Buscar dados
 st.write("Buscando dados, aguarde...")
-df = pegar_dados(moeda, dias)
-st.success("Dados carregados com sucesso!")
+api_ok = False
+try:
+    df = pegar_dados(moeda, dias)
+    api_ok = not df.attrs.get("stale", False)
+    if not api_ok:
+        st.warning(f"API indisponível. Exibindo dados em cache de {df.attrs['idade'] / 60:.0f} min atrás.")
+    try:
+        arquivar_cotacoes(df, moeda)
+    except Exception as e:
+        print("Erro ao arquivar dados:", e)
+    if api_ok:
+        st.success("Dados carregados com sucesso!")
+except ErroAPI as e:
+    # API fora do ar: usa o recorte arquivado da mesma janela
+    df = carregar_cotacoes(moeda, inicio=pd.Timestamp.now() - pd.Timedelta(days=dias))
+    if df.empty:
+        st.error(f"Não foi possível buscar os dados: {e}")
+        st.stop()
+    st.warning(f"API indisponível ({e}). Exibindo dados arquivados.")
 
 # Simular tempo de espera para melhor experiência visual
 time.sleep(3)
@@ -75,6 +93,17 @@ st.write("Previsão para os próximos dias:")
 for i in range(dias_futuros):
     st.write(f"Dia {i+1}: R$ {y_pred[i]:.2f}")
 
+# Arquivar a previsão (guardada uma vez por dia, os reruns do mesmo dia são ignorados)
+if api_ok:
+    try:
+        df_pred = pd.DataFrame({
+            'timestamp': [df['timestamp'].iloc[-1] + pd.Timedelta(days=i+1) for i in range(dias_futuros)],
+            'bid': y_pred,
+        })
+        arquivar_previsao(df_pred, moeda, dias, modelo="linear")
+    except Exception as e:
+        print("Erro ao arquivar previsão:", e)
+
 # Gráfico com Matplotlib da previsão
 fig2, ax2 = plt.subplots()
 ax2.plot(X.flatten(), df['bid'], label='Histórico', marker='o')
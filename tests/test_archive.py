@@ -0,0 +1,149 @@
+import datetime
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+import archive
+
+
+@pytest.fixture(autouse=True)
+def pasta_arquivo(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "COTACOES_FOLDER", str(tmp_path / "cotacoes"))
+    monkeypatch.setattr(archive, "PREVISOES_FOLDER", str(tmp_path / "previsoes"))
+    return tmp_path
+
+
+def _cotacoes(inicio="2026-09-01", dias=20, hora="15:00"):
+    datas = pd.date_range(f"{inicio} {hora}", periods=dias, freq="D")
+    return pd.DataFrame({"timestamp": datas, "bid": [5 + i / 100 for i in range(dias)]})
+
+
+def _arquivos(pasta):
+    return glob.glob(os.path.join(str(pasta), "**", "*.parquet"), recursive=True)
+
+
+def test_arquivo_vazio():
+    assert archive.carregar_cotacoes("USD", inicio="2026-09-10").empty
+    assert archive.carregar_previsoes("USD").empty
+
+
+@pytest.mark.parametrize("inicio, fim", [
+    ("2026-09-10", "2026-09-15 23:59"),
+    (datetime.datetime(2026, 9, 10), datetime.datetime(2026, 9, 15, 23, 59)),
+    (datetime.date(2026, 9, 10), pd.Timestamp("2026-09-15 23:59")),
+])
+def test_leitura_filtrada_por_data(inicio, fim):
+    assert archive.arquivar_cotacoes(_cotacoes(), "usd") == 20
+    archive.arquivar_cotacoes(_cotacoes(), "EUR")
+
+    df = archive.carregar_cotacoes("USD", inicio=inicio, fim=fim)
+    assert list(df.columns) == ["timestamp", "bid"]
+    assert df["timestamp"].dt.day.tolist() == list(range(10, 16))
+
+
+def test_particiona_por_moeda_e_mes(pasta_arquivo):
+    archive.arquivar_cotacoes(_cotacoes("2026-09-25", dias=10), "USD")
+    particoes = sorted(os.path.relpath(os.path.dirname(a), pasta_arquivo / "cotacoes")
+                       for a in _arquivos(pasta_arquivo / "cotacoes"))
+    assert particoes == [os.path.join("moeda=USD", "mes=2026-09"), os.path.join("moeda=USD", "mes=2026-10")]
+
+    df = archive.carregar_cotacoes("USD", inicio="2026-10-01")
+    assert df["timestamp"].min() == pd.Timestamp("2026-10-01 15:00")
+
+
+def test_cotacao_do_dia_mais_recente(pasta_arquivo):
+    archive.arquivar_cotacoes(_cotacoes(dias=5), "USD")
+    # mesma janela buscada de novo: nada a gravar
+    assert archive.arquivar_cotacoes(_cotacoes(dias=5), "USD") == 0
+
+    # a cotação do último dia avança ao longo do dia
+    for minuto in (5, 10, 15):
+        df = _cotacoes(dias=5)
+        df.loc[4, "timestamp"] += pd.Timedelta(minutes=minuto)
+        df.loc[4, "bid"] = 6 + minuto / 100
+        assert archive.arquivar_cotacoes(df, "USD") == 1
+
+    # só acrescenta: um arquivo por gravação, duplicatas resolvidas na leitura
+    assert len(_arquivos(pasta_arquivo / "cotacoes")) == 4
+    df = archive.carregar_cotacoes("USD")
+    assert len(df) == 5
+    assert df["timestamp"].iloc[-1] == pd.Timestamp("2026-09-05 15:15")
+    assert df["bid"].iloc[-1] == pytest.approx(6.15)
+
+    # uma cotação mais antiga do mesmo dia não substitui a mais recente
+    assert archive.arquivar_cotacoes(_cotacoes(dias=5), "USD") == 0
+
+    assert archive.compactar() == 1
+    assert len(_arquivos(pasta_arquivo / "cotacoes")) == 1
+    pd.testing.assert_frame_equal(archive.carregar_cotacoes("USD"), df)
+
+
+def _previsao(bid=5.2):
+    return pd.DataFrame({"timestamp": pd.date_range("2026-09-21", periods=3), "bid": [bid, bid + .1, bid + .2]})
+
+
+def test_previsoes(pasta_arquivo):
+    assert archive.arquivar_previsao(_previsao(), "USD", 7, modelo="linear", gerado_em=datetime.datetime(2026, 9, 20, 10)) == 3
+    assert archive.arquivar_previsao(_previsao(), "USD", 7, modelo="prophet", gerado_em=datetime.datetime(2026, 9, 20, 11)) == 3
+
+    df = archive.carregar_previsoes("USD", inicio=datetime.date(2026, 9, 22), modelo="linear")
+    assert len(df) == 2
+    assert df["min"].isna().all()
+    assert (df["dias_historico"] == 7).all()
+    assert len(archive.carregar_previsoes("USD")) == 6
+
+
+def test_uma_previsao_por_dia(pasta_arquivo):
+    archive.arquivar_previsao(_previsao(5.2), "USD", 7, modelo="linear", gerado_em=datetime.datetime(2026, 9, 20, 10))
+    # novos refreshes no mesmo dia não gravam nada
+    for hora in (11, 12, 13):
+        assert archive.arquivar_previsao(_previsao(5.3), "USD", 7, modelo="linear",
+                                         gerado_em=datetime.datetime(2026, 9, 20, hora)) == 0
+    # outra janela de histórico ou outro dia são previsões diferentes
+    assert archive.arquivar_previsao(_previsao(), "USD", 15, modelo="linear", gerado_em=datetime.datetime(2026, 9, 20, 10)) == 3
+    assert archive.arquivar_previsao(_previsao(), "USD", 7, modelo="linear", gerado_em=datetime.datetime(2026, 9, 21, 10)) == 3
+    assert len(archive.carregar_previsoes("USD")) == 9
+    assert len(_arquivos(pasta_arquivo / "previsoes")) == 3
+
+
+def test_escritores_concorrentes_nao_duplicam(pasta_arquivo):
+    # dois escritores que passaram juntos pela checagem gravam a mesma previsão do dia
+    archive.arquivar_previsao(_previsao(), "USD", 7, modelo="linear", gerado_em=datetime.datetime(2026, 9, 20, 10))
+    pred = _previsao(5.4).assign(min=float("nan"), max=float("nan"), dias_historico=7, modelo="linear",
+                                 gerado_em=pd.Timestamp("2026-09-20 10:05"), mes="2026-09")
+    archive._acrescentar(pred, archive.PREVISOES_FOLDER, "USD", archive.SCHEMA_PREVISOES)
+    archive.arquivar_previsao(_previsao(), "USD", 15, modelo="linear", gerado_em=datetime.datetime(2026, 9, 20, 10))
+
+    df = archive.carregar_previsoes("USD")
+    assert len(df) == 6
+    assert df[df["dias_historico"] == 7]["bid"].tolist() == pytest.approx([5.4, 5.5, 5.6])
+
+    assert archive.compactar() == 1
+    pd.testing.assert_frame_equal(archive.carregar_previsoes("USD"), df)
+
+
+def test_compactacao_respeita_trava(pasta_arquivo):
+    archive.arquivar_cotacoes(_cotacoes(dias=3), "USD")
+    archive.arquivar_cotacoes(_cotacoes("2026-09-04", dias=3), "USD")
+    trava = pasta_arquivo / "cotacoes" / "moeda=USD" / "mes=2026-09" / ".compactando.lock"
+    trava.touch()
+    assert archive.compactar() == 0
+    assert len(_arquivos(pasta_arquivo / "cotacoes")) == 2
+
+    # trava abandonada por um processo que morreu
+    velho = trava.stat().st_mtime - archive.TRAVA_EXPIRA - 1
+    os.utime(trava, (velho, velho))
+    assert archive.compactar() == 1
+    assert not trava.exists()
+    assert len(archive.carregar_cotacoes("USD")) == 6
+
+
+def test_exportar_excel(tmp_path):
+    destino = str(tmp_path / "USD.xlsx")
+    assert archive.exportar_excel("USD", destino, inicio="2026-09-10") is None
+
+    archive.arquivar_cotacoes(_cotacoes(), "USD")
+    assert archive.exportar_excel("USD", destino, inicio="2026-09-10", fim="2026-09-12 23:59") == destino
+    assert os.path.getsize(destino) > 0
@@ -0,0 +1,59 @@
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import archive
+import automation
+
+
+def _pegar_dados(moeda="USD", dias=7):
+    if moeda == "XXX":
+        raise RuntimeError("moeda inexistente")
+    return pd.DataFrame({
+        "timestamp": pd.date_range("2026-09-01 15:00", periods=dias, freq="D"),
+        "bid": np.linspace(5, 6, dias),
+    })
+
+
+@pytest.fixture(autouse=True)
+def pastas(tmp_path, monkeypatch):
+    monkeypatch.setattr(automation, "REPORTS_FOLDER", str(tmp_path / "reports"))
+    monkeypatch.setattr(automation, "pegar_dados", _pegar_dados)
+    monkeypatch.setattr(archive, "COTACOES_FOLDER", str(tmp_path / "archive" / "cotacoes"))
+    monkeypatch.setattr(archive, "PREVISOES_FOLDER", str(tmp_path / "archive" / "previsoes"))
+    os.makedirs(tmp_path / "reports")
+    return tmp_path / "reports"
+
+
+def test_lote_gera_toda_a_matriz(pastas):
+    manifesto_path = automation.gerar_relatorios_lote(["USD", "EUR", "XXX"], [7, 15], ["xlsx", "pdf"], max_workers=2)
+    with open(manifesto_path, encoding="utf-8") as f:
+        manifesto = json.load(f)
+
+    buscas = {b["moeda"]: b for b in manifesto["buscas"]}
+    assert "segundos" in buscas["USD"] and "segundos" in buscas["EUR"]
+    assert "moeda inexistente" in buscas["XXX"]["erro"]
+
+    relatorios = manifesto["relatorios"]
+    assert sorted((r["moeda"], r["dias"], r["formato"]) for r in relatorios) == sorted(
+        (m, d, f) for m in ("USD", "EUR") for d in (7, 15) for f in ("xlsx", "pdf"))
+    for r in relatorios:
+        assert "erro" not in r
+        assert r["segundos"] >= 0
+        assert os.path.getsize(r["arquivo"]) > 0
+        assert os.path.dirname(r["arquivo"]) == str(pastas)
+    assert manifesto["segundos_arquivamento"] >= 0
+    assert manifesto["segundos_total"] >= manifesto["segundos_arquivamento"]
+
+    assert glob.glob(str(pastas / "*.tmp*")) == []
+
+
+@pytest.mark.parametrize("dias, formatos", [([], ["xlsx"]), ([7], []), ([7], ["csv"]), ([7], ["pdf", "docx"])])
+def test_lote_rejeita_parametros_invalidos(dias, formatos, pastas):
+    with pytest.raises(ValueError):
+        automation.gerar_relatorios_lote(["USD"], dias, formatos)
+    assert os.listdir(pastas) == []
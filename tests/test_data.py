@@ -0,0 +1,263 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import data
+
+
+class Resposta:
+    def __init__(self, status=200, corpo=None, headers=None):
+        self.status_code = status
+        self._corpo = corpo
+        self.headers = headers or {}
+        self.text = str(corpo)
+
+    def json(self):
+        if isinstance(self._corpo, Exception):
+            raise self._corpo
+        return self._corpo
+
+
+def _cotacoes(bid="5.10", n=3):
+    return [{"timestamp": str(1760000000 + i * 86400), "bid": bid} for i in range(n)]
+
+
+@pytest.fixture(autouse=True)
+def estado_limpo(monkeypatch):
+    monkeypatch.setattr(data, "_cache", {})
+    monkeypatch.setattr(data, "_atualizando", set())
+    monkeypatch.setattr(data, "_circuito", data.CircuitBreaker(3, 60))
+    monkeypatch.setattr(data, "_limitador", data.TokenBucket(1000, 1000))
+    monkeypatch.setattr(data, "BACKOFF_BASE", 0)
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Substitui _sessao.get por uma fila de respostas e registra as chamadas."""
+    respostas, chamadas = [], []
+
+    def get(url, timeout=None):
+        chamadas.append((url, timeout))
+        r = respostas.pop(0)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+    monkeypatch.setattr(data._sessao, "get", get)
+    return respostas, chamadas
+
+
+def _esperar(condicao, limite=2):
+    fim = time.monotonic() + limite
+    while not condicao():
+        assert time.monotonic() < fim, "condição não atingida"
+        time.sleep(0.01)
+
+
+# ----- TokenBucket / CircuitBreaker -----
+def test_token_bucket_respeita_capacidade_e_taxa():
+    balde = data.TokenBucket(taxa=20, capacidade=2)
+    assert balde.adquirir(timeout=0) and balde.adquirir(timeout=0)
+    assert not balde.adquirir(timeout=0)
+    inicio = time.monotonic()
+    assert balde.adquirir(timeout=1)
+    assert 0.03 <= time.monotonic() - inicio < 0.5
+
+
+def test_circuit_breaker_abre_e_meio_abre(monkeypatch):
+    agora = [time.monotonic()]
+    monkeypatch.setattr(data.time, "monotonic", lambda: agora[0])
+    circuito = data.CircuitBreaker(max_falhas=2, espera=10)
+    circuito.falha()
+    assert circuito.permitir()
+    circuito.falha()
+    assert not circuito.permitir()
+    agora[0] += 10
+    assert circuito.permitir()       # uma tentativa de teste
+    assert not circuito.permitir()   # as demais esperam o resultado
+    circuito.sucesso()
+    assert circuito.permitir()
+
+
+# ----- _buscar -----
+def test_busca_com_timeout_e_conversao(api):
+    respostas, chamadas = api
+    respostas.append(Resposta(corpo=_cotacoes()))
+    df = data.pegar_dados("usd", 3)
+    assert list(df.columns) == ["timestamp", "bid"]
+    assert df["bid"].tolist() == [5.10] * 3
+    assert chamadas == [("https://economia.awesomeapi.com.br/json/daily/USD-BRL/3", data.TIMEOUT)]
+
+
+def test_repete_429_e_5xx_com_backoff(api):
+    respostas, chamadas = api
+    respostas.extend([Resposta(429, {}, {"Retry-After": "0"}), Resposta(503, {}), Resposta(corpo=_cotacoes())])
+    assert len(data.pegar_dados("USD", 3)) == 3
+    assert len(chamadas) == 3
+
+
+def test_corpo_invalido_vira_erro_api(api):
+    respostas, chamadas = api
+    respostas.extend([Resposta(corpo=ValueError("not json"))] * data.TENTATIVAS)
+    with pytest.raises(data.ErroAPI):
+        data.pegar_dados("USD", 3)
+    assert len(chamadas) == data.TENTATIVAS
+
+
+@pytest.mark.parametrize("resposta", [
+    Resposta(200, {"status": 404, "code": "CoinNotExists", "message": "moeda nao encontrada XYZ-BRL"}),
+    Resposta(404, {"status": 404, "code": "CoinNotExists", "message": "moeda nao encontrada XYZ-BRL"}),
+])
+def test_erro_do_pedido_nao_repete_nem_abre_circuito(api, resposta):
+    respostas, chamadas = api
+    respostas.extend([resposta] * 4)
+    for _ in range(4):
+        with pytest.raises(data.ErroPedido):
+            data.pegar_dados("XYZ", 3)
+    assert len(chamadas) == 4
+    assert data._circuito.permitir()
+
+
+def test_circuito_aberto_falha_sem_chamar_api(api):
+    respostas, chamadas = api
+    respostas.extend([requests.ConnectionError("down")] * data.TENTATIVAS)
+    with pytest.raises(data.ErroAPI):
+        data.pegar_dados("USD", 3)
+    with pytest.raises(data.ErroAPI, match="Circuito aberto"):
+        data.pegar_dados("EUR", 3)
+    assert len(chamadas) == data.TENTATIVAS
+
+
+# ----- Retry-After / circuito -----
+def test_retry_after_dentro_do_orcamento_e_respeitado(api, monkeypatch):
+    respostas, chamadas = api
+    esperas = []
+    monkeypatch.setattr(data.time, "sleep", esperas.append)
+    respostas.extend([Resposta(429, {}, {"Retry-After": "4"}), Resposta(corpo=_cotacoes())])
+    assert len(data.pegar_dados("USD", 3)) == 3
+    assert esperas == [4.0]
+
+
+def test_retry_after_acima_do_orcamento_desiste(api, monkeypatch):
+    respostas, chamadas = api
+    esperas = []
+    monkeypatch.setattr(data.time, "sleep", esperas.append)
+    respostas.append(Resposta(429, {}, {"Retry-After": "60"}))
+    with pytest.raises(data.ErroAPI, match="orçamento"):
+        data.pegar_dados("USD", 3)
+    assert len(chamadas) == 1 and esperas == []
+    # um 429 é resposta da API: não abre o circuito
+    assert data._circuito._falhas == 0
+
+
+def test_erro_do_pedido_fecha_circuito_meio_aberto(api, monkeypatch):
+    respostas, chamadas = api
+    agora = [time.monotonic()]
+    monkeypatch.setattr(data.time, "monotonic", lambda: agora[0])
+    monkeypatch.setattr(data, "_circuito", data.CircuitBreaker(1, 60))
+    data._circuito.falha()
+    assert not data._circuito.permitir()
+
+    agora[0] += 60
+    respostas.append(Resposta(200, {"code": "CoinNotExists", "message": "XYZ"}))
+    with pytest.raises(data.ErroPedido):
+        data.pegar_dados("XYZ", 3)
+    assert data._circuito._aberto_em is None
+    assert data._circuito.permitir()
+
+
+# ----- cache / dados velhos -----
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = [time.monotonic()]
+    monkeypatch.setattr(data.time, "monotonic", lambda: agora[0])
+    return agora
+
+
+def test_cache_fresco_nao_chama_api(api):
+    respostas, chamadas = api
+    respostas.append(Resposta(corpo=_cotacoes()))
+    data.pegar_dados("USD", 3)
+    df = data.pegar_dados("USD", 3)
+    assert len(chamadas) == 1
+    assert df.attrs["stale"] is False
+
+
+def test_chamadas_periodicas_recebem_dado_atual(api, relogio):
+    respostas, chamadas = api
+    respostas.extend([Resposta(corpo=_cotacoes(b)) for b in ("5.10", "5.20", "5.30")])
+    valores = []
+    for _ in range(3):
+        df = data.pegar_dados("USD", 3)
+        valores.append(df["bid"].iloc[-1])
+        assert df.attrs["stale"] is False
+        relogio[0] += 3600
+    assert valores == [5.10, 5.20, 5.30]
+
+
+def test_falha_na_atualizacao_serve_cache_com_idade(api, relogio):
+    respostas, chamadas = api
+    respostas.append(Resposta(corpo=_cotacoes("5.10")))
+    data.pegar_dados("USD", 3)
+
+    relogio[0] += 600
+    respostas.extend([requests.Timeout("lento")] * data.TENTATIVAS)
+    df = data.pegar_dados("USD", 3)
+    assert df["bid"].iloc[-1] == 5.10
+    assert df.attrs == {"idade": 600, "stale": True}
+
+
+def test_circuito_aberto_serve_cache_sem_chamar_api(api, relogio, monkeypatch):
+    respostas, chamadas = api
+    monkeypatch.setattr(data, "_circuito", data.CircuitBreaker(3, espera=3600))
+    respostas.append(Resposta(corpo=_cotacoes("5.10")))
+    data.pegar_dados("USD", 3)
+    for _ in range(data._circuito.max_falhas):
+        data._circuito.falha()
+
+    relogio[0] += 600
+    df = data.pegar_dados("USD", 3)
+    assert df.attrs["stale"] is True
+    assert len(chamadas) == 1
+
+
+def test_cache_acima_da_idade_maxima_nao_e_servido(api, relogio):
+    respostas, chamadas = api
+    respostas.append(Resposta(corpo=_cotacoes("5.10")))
+    data.pegar_dados("USD", 3)
+
+    relogio[0] += data.IDADE_MAXIMA + 1
+    respostas.extend([requests.ConnectionError("down")] * data.TENTATIVAS)
+    with pytest.raises(data.ErroAPI, match="acima do limite"):
+        data.pegar_dados("USD", 3)
+
+
+def test_atualizacao_em_andamento_serve_cache(api, monkeypatch):
+    respostas, chamadas = api
+    respostas.append(Resposta(corpo=_cotacoes("5.10")))
+    data.pegar_dados("USD", 3)
+    monkeypatch.setattr(data, "CACHE_TTL", 0)
+
+    liberar = threading.Event()
+    def get_lento(url, timeout=None):
+        chamadas.append((url, timeout))
+        liberar.wait(2)
+        return Resposta(corpo=_cotacoes("5.20"))
+    monkeypatch.setattr(data._sessao, "get", get_lento)
+
+    resultado = []
+    t = threading.Thread(target=lambda: resultado.append(data.pegar_dados("USD", 3)))
+    t.start()
+    _esperar(lambda: ("USD", 3) in data._atualizando)
+
+    inicio = time.monotonic()
+    df = data.pegar_dados("USD", 3)
+    assert time.monotonic() - inicio < 0.5
+    assert df["bid"].iloc[-1] == 5.10 and df.attrs["stale"] is True
+
+    liberar.set()
+    t.join(2)
+    assert resultado[0]["bid"].iloc[-1] == 5.20
+    assert len(chamadas) == 2